@@ -1,4 +1,4 @@
-import numpy as np
+import random
 from algorithms.base_algorithm import BaseMABAlgorithm
 
 class ExplorationOnly(BaseMABAlgorithm):
@@ -17,5 +17,6 @@ class ExplorationOnly(BaseMABAlgorithm):
         
         Strategy: Pure exploration - randomly select any arm with equal probability
         """
-        # Randomly select an arm between 0 and n_arms-1
-        return np.random.randint(0, self.n_arms) 
\ No newline at end of file
+        # Randomly select an arm between 0 and n_arms-1; the stdlib stream (seeded alongside
+        # np.random by the environment) is cheaper per call and leaves reward draws untouched
+        return random.randrange(self.n_arms)
@@ -33,23 +33,25 @@ def run_mcts():
     rng = random.Random(0)
     num_episodes = 20
     
-    for ep in range(num_episodes):
-        s = env.initial_state()
-        steps = 0
-        total_reward = 0.0
-        max_steps = 1000
+    # One worker pool for the whole run (None unless cfg.workers > 1)
+    with agent.make_pool() as pool:
+        for ep in range(num_episodes):
+            s = env.initial_state()
+            steps = 0
+            total_reward = 0.0
+            max_steps = 1000
         
-        while not env.is_terminal(s) and steps < max_steps:
-            # Use MCTS to choose action
-            a = agent.search(s)
+            while not env.is_terminal(s) and steps < max_steps:
+                # Use MCTS to choose action
+                a = agent.search(s, pool=pool)
             
-            # Execute action
-            next_s, reward = sample_next_state_and_reward(env, s, a, rng)
-            total_reward += reward
-            s = next_s
-            steps += 1
+                # Execute action
+                next_s, reward = sample_next_state_and_reward(env, s, a, rng)
+                total_reward += reward
+                s = next_s
+                steps += 1
         
-        print(f"Episode {ep + 1}/{num_episodes}: Steps = {steps}, Total Reward = {total_reward:.2f}")
+            print(f"Episode {ep + 1}/{num_episodes}: Steps = {steps}, Total Reward = {total_reward:.2f}")
     print()
 
 
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
 import math
-from dataclasses import dataclass
-from typing import Dict, Optional, Tuple
+import multiprocessing
+import pickle
+import random
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import ContextManager, Dict, List, Optional, Tuple
 
-from gridworld import MDP, State, Action, sample_next_state_and_reward
+from gridworld import MDP, State, Action
 
 
 @dataclass
@@ -13,19 +19,34 @@ class MCTSConfig:
     c_uct: float = 1.4
     rollouts: int = 200
     max_depth: int = 200
+    seed: int = 0  # seeds the default rng; parallel streams are spawned from it
+    workers: int = 1  # >1 enables root parallelization across processes (mdp and heuristic must pickle)
+    threads: int = 1  # >1 enables tree parallelization within one search tree
+    vloss: float = 1.0  # virtual loss applied to in-flight paths when threads > 1
+    rollout_depth: int = 20  # rollout length before bootstrapping from the heuristic, if given
+    leaf_rollouts: int = 1  # rollouts averaged per expanded leaf (leaf parallelization)
+    transpositions: bool = False  # share one node per state (search graph instead of tree)
+
+    def __post_init__(self) -> None:
+        if self.leaf_rollouts < 1:
+            raise ValueError(f"leaf_rollouts must be >= 1, got {self.leaf_rollouts}")
 
 
 class Node:
-    def __init__(self, state: State, parent: Optional[Tuple["Node", Action]] = None) -> None:
+    __slots__ = ("state", "parent", "visits", "actions", "untried_mask", "child_nodes", "child_visits", "child_value_sum")
+
+    def __init__(
+        self, state: State, actions: Tuple[Action, ...], parent: Optional[Tuple["Node", int]] = None
+    ) -> None:
         self.state = state
-        self.parent = parent
-        self.children: Dict[Action, Node] = {}
+        self.parent = parent  # (parent node, index of this child in its slots)
         self.visits = 0
-        self.value_sum = 0.0
-
-    @property
-    def q(self) -> float:
-        return 0.0 if self.visits == 0 else self.value_sum / float(self.visits)
+        # Edge statistics as parallel lists indexed like actions; None marks an untried action
+        self.actions = actions
+        self.untried_mask = (1 << len(actions)) - 1  # bit i set while actions[i] is unexpanded
+        self.child_nodes: List[Optional[Node]] = [None] * len(actions)
+        self.child_visits: List[int] = [0] * len(actions)
+        self.child_value_sum: List[float] = [0.0] * len(actions)
 
 
 class MCTS:
@@ -34,101 +55,318 @@ class MCTS:
         self.cfg = cfg
         self.rng = rng
         self.heuristic = heuristic
+        # Tree lock; a no-op context unless _grow runs simulations on several threads
+        self._lock: ContextManager = nullcontext()
+        self._actions_cache: Dict[State, Tuple[Action, ...]] = {}
+        self._transitions_cache: Dict[Tuple[State, Action], Tuple[Tuple[float, State, float], ...]] = {}
+        # Transposition table: one node per state when cfg.transpositions is set
+        self._tt: Dict[State, Node] = {}
         if self.rng is None:
-            import random
+            self.rng = random.Random(cfg.seed)
+
+    def make_pool(self) -> ContextManager[Optional[ProcessPoolExecutor]]:
+        """Worker pool to reuse across search(..., pool=pool) calls; yields None when workers <= 1.
+
+        Workers are started with this searcher's mdp, cfg and heuristic. Under the spawn and
+        forkserver start methods (spawn is the default on Windows) these are pickled, so a lambda
+        or locally defined heuristic has to be replaced by a module-level function.
+        """
+        if self.cfg.workers <= 1:
+            return nullcontext()
+        # Peek at the start method without fixing it, so callers can still set_start_method later
+        method = multiprocessing.get_start_method(allow_none=True) or multiprocessing.get_all_start_methods()[0]
+        ctx = multiprocessing.get_context(method)
+        if ctx.get_start_method() != "fork":
+            try:
+                pickle.dumps((self.mdp, self.cfg, self.heuristic))
+            except (pickle.PicklingError, AttributeError, TypeError) as e:
+                raise ValueError(
+                    "MCTS with workers > 1 needs a picklable mdp and heuristic "
+                    f"(use a module-level function, not a lambda): {e}"
+                ) from e
+        return ProcessPoolExecutor(
+            max_workers=self.cfg.workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(self.mdp, self.cfg, self.heuristic),
+        )
+
+    def search(self, root_state: State, pool: Optional[ProcessPoolExecutor] = None) -> Action:
+        """Pick an action for root_state; pool must come from this searcher's make_pool"""
+        if self.cfg.workers > 1:
+            if pool is None:
+                with self.make_pool() as pool:
+                    stats = self._search_parallel(root_state, pool)
+            else:
+                stats = self._search_parallel(root_state, pool)
+        else:
+            root = self._grow(root_state, self.cfg.rollouts)
+            stats = _root_stats(root)
+            self._release_graph()
+
+        if not stats:
+            actions = self._actions(root_state)
+            if not actions:
+                raise RuntimeError("MCTS on terminal state")
+            return actions[0]
+        # choose action with most visits (first one on ties)
+        return max(stats.items(), key=lambda kv: kv[1][0])[0]
 
-            self.rng = random.Random(0)
+    def _actions(self, s: State) -> Tuple[Action, ...]:
+        """Action set of s, cached since it is queried on every rollout step"""
+        t = self._actions_cache.get(s)
+        if t is None:
+            t = tuple(self.mdp.actions(s))
+            self._actions_cache[s] = t
+        return t
 
-    def search(self, root_state: State) -> Action:
-        root = Node(root_state)
-        for _ in range(self.cfg.rollouts):
-            # YOUR CODE HERE: one MCTS iteration (selection, expansion, rollout, backprop)
+    def _step(self, s: State, a: Action, rng: random.Random) -> Tuple[State, float]:
+        """Same sampling as sample_next_state_and_reward, over a cached cumulative table"""
+        table = self._transitions_cache.get((s, a))
+        if table is None:
+            acc = 0.0
+            rows = []
+            for t in self.mdp.transitions(s, a):
+                acc += t.probability
+                rows.append((acc, t.next_state, t.reward))
+            table = tuple(rows)
+            self._transitions_cache[(s, a)] = table
+        r = rng.random()
+        for acc, next_s, reward in table:
+            if r <= acc:
+                return next_s, reward
+        return s, 0.0
+
+    def _spawn_seeds(self, n: int) -> List[int]:
+        """Seeds for n independent worker streams, drawn from self.rng so runs stay reproducible.
+
+        Each worker must build its own random.Random from its seed; a Random instance is
+        never shared between workers.
+        """
+        return [self.rng.getrandbits(64) for _ in range(n)]
+
+    def _release_graph(self) -> None:
+        """Drop references to the last search graph so it can be freed"""
+        self._tt.clear()
+
+    def _search_parallel(self, root_state: State, pool: ProcessPoolExecutor) -> Dict[Action, Tuple[int, float]]:
+        """Root parallelization: independent trees per worker, merged at the root"""
+        workers = self.cfg.workers
+        tasks = [
+            (root_state, rollouts, seed)
+            for rollouts, seed in zip(_split(self.cfg.rollouts, workers), self._spawn_seeds(workers))
+        ]
+        merged: Dict[Action, Tuple[int, float]] = {}
+        for stats in pool.map(_search_worker, tasks):
+            for a, (visits, value_sum) in stats.items():
+                v, w = merged.get(a, (0, 0.0))
+                merged[a] = (v + visits, w + value_sum)
+        return merged
+
+    def _grow(self, root_state: State, rollouts: int) -> Node:
+        """Build a search tree rooted at root_state with the given number of iterations"""
+        self._release_graph()
+        root = Node(root_state, self._actions(root_state))
+        if self.cfg.transpositions:
+            self._tt[root_state] = root
+        if self.cfg.threads > 1:
+            # Tree parallelization: threads share one tree, virtual loss spreads them out
+            threads = self.cfg.threads
+            self._lock = threading.Lock()
+
+            def run(n: int, seed: int) -> None:
+                rng = random.Random(seed)
+                for _ in range(n):
+                    self._simulate(root, rng, self.cfg.vloss)
+
+            try:
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    list(pool.map(run, _split(rollouts, threads), self._spawn_seeds(threads)))
+            finally:
+                self._lock = nullcontext()
+        else:
+            for _ in range(rollouts):
+                self._simulate(root, self.rng)
+        return root
+
+    def _simulate(self, root: Node, rng: random.Random, vloss: float = 0.0) -> None:
+        """One MCTS iteration: selection, expansion, rollout, backprop"""
+        # Bind config constants and bound methods once; read per call so cfg edits still apply
+        is_terminal = self.mdp.is_terminal
+        max_depth = self.cfg.max_depth
+        select = self._select_uct
+        with self._lock:
             # Selection: traverse tree using UCT
             node = root
-            path = [node]
+            # Edges taken are recovered from parent links, except in a transposition graph
+            # where a shared node has several parents and the path must be recorded
+            path: Optional[List[Tuple[Node, int]]] = [] if self.cfg.transpositions else None
+            # Nodes on the recorded path, so a simulation never walks a cycle in the graph
+            on_path = {root} if path is not None else None
             depth = 0
             
-            while node.children and not self.mdp.is_terminal(node.state) and depth < self.cfg.max_depth:
-                # Select child using UCT
-                action = self._select_uct(node)
-                node = node.children[action]
-                path.append(node)
+            while (
+                not node.untried_mask
+                and node.actions
+                and not is_terminal(node.state)
+                and depth < max_depth
+            ):
+                # Select child of a fully expanded node using UCT
+                i, child = select(node)
+                if path is not None:
+                    if child in on_path:
+                        break  # the edge closes a cycle: roll out from here instead
+                    on_path.add(child)
+                    path.append((node, i))
+                node = child
                 depth += 1
             
             # Expansion: if not terminal and not at max depth, expand
-            if not self.mdp.is_terminal(node.state) and depth < self.cfg.max_depth:
-                actions = list(self.mdp.actions(node.state))
-                if actions:
-                    # Pick an unexplored action
-                    unexplored = [a for a in actions if a not in node.children]
-                    if unexplored:
-                        action = self.rng.choice(unexplored)
-                        next_s, _ = sample_next_state_and_reward(self.mdp, node.state, action, self.rng)
-                        child = Node(next_s, parent=(node, action))
-                        node.children[action] = child
-                        path.append(child)
-                        node = child
-                        depth += 1
-            
-            # Rollout: simulate from current node to terminal or max depth
-            value = self._rollout(node.state, depth)
-            
-            # Backpropagation: update all nodes in path
-            for n in path:
-                n.visits += 1
-                n.value_sum += value
-
-        # choose action with most visits
-        best_a = None
-        best_v = -1
-        for a, ch in root.children.items():
-            if ch.visits > best_v:
-                best_v = ch.visits
-                best_a = a
-        if best_a is None:
-            actions = list(self.mdp.actions(root_state))
-            if not actions:
-                raise RuntimeError("MCTS on terminal state")
-            best_a = actions[0]
-        return best_a
+            if not is_terminal(node.state) and depth < max_depth:
+                mask = node.untried_mask
+                if mask:
+                    # Pick an unexplored action and clear its bit
+                    i = rng.choice([b for b in range(len(node.actions)) if mask >> b & 1])
+                    node.untried_mask = mask & ~(1 << i)
+                    action = node.actions[i]
+                    next_s, _ = self._step(node.state, action, rng)
+                    # Transpositions: reuse the node if this state is already in the graph
+                    child = self._tt.get(next_s)
+                    if child is not None and child in on_path:
+                        # Never link back into the current path (e.g. a wall bump self-loop);
+                        # the edge gets its own unshared node instead
+                        child = None
+                    if child is None:
+                        child = Node(next_s, self._actions(next_s), parent=(node, i))
+                        if self.cfg.transpositions and next_s not in self._tt:
+                            self._tt[next_s] = child
+                    node.child_nodes[i] = child
+                    if path is not None:
+                        on_path.add(child)
+                        path.append((node, i))
+                    node = child
+                    depth += 1
 
-    def _select_uct(self, node: Node) -> Action:
-        """Select action using UCT formula"""
-        best_action = None
+            # Virtual loss: count the visits now and pessimise the value until backprop
+            k = self.cfg.leaf_rollouts
+            if path is not None:
+                for n, i in path:
+                    n.visits += k
+                    n.child_visits[i] += k
+                    if vloss:
+                        n.child_value_sum[i] -= vloss * k
+            else:
+                edge = node.parent
+                while edge is not None:
+                    n, i = edge
+                    n.visits += k
+                    n.child_visits[i] += k
+                    if vloss:
+                        n.child_value_sum[i] -= vloss * k
+                    edge = n.parent
+            node.visits += k
+        
+        # Rollout: simulate k times from current node to terminal or max depth
+        value_sum = sum(self._rollout(node.state, depth, rng) for _ in range(k))
+        
+        # Backpropagation: undo the virtual loss and add the real returns
+        value_sum += vloss * k
+        with self._lock:
+            if path is not None:
+                for n, i in path:
+                    n.child_value_sum[i] += value_sum
+            else:
+                edge = node.parent
+                while edge is not None:
+                    n, i = edge
+                    n.child_value_sum[i] += value_sum
+                    edge = n.parent
+
+    def _select_uct(self, node: Node) -> Tuple[int, Node]:
+        """Select (child index, child) using UCT formula over the node's child lists"""
+        best_i = 0
         best_score = float('-inf')
+        # c * sqrt(ln N) is shared by all children, so compute it once per node
+        c_sqrt_log_n = self.cfg.c_uct * math.sqrt(math.log(node.visits))
         
-        for action, child in node.children.items():
-            if child.visits == 0:
-                return action  # Prefer unvisited children
-            
+        value_sum = node.child_value_sum
+        sqrt = math.sqrt
+        
+        # Only fully expanded nodes are selected from, and an edge is counted as visited in
+        # the same locked step that expands it, so every n here is at least 1
+        for i, n in enumerate(node.child_visits):
             # UCT formula: Q + c * sqrt(ln(N) / N_a)
-            exploit = child.q
-            explore = self.cfg.c_uct * math.sqrt(math.log(node.visits) / child.visits)
-            score = exploit + explore
+            score = value_sum[i] / n + c_sqrt_log_n / sqrt(n)
             
             if score > best_score:
                 best_score = score
-                best_action = action
+                best_i = i
         
-        return best_action
+        return best_i, node.child_nodes[best_i]
     
-    def _rollout(self, state: State, depth: int) -> float:
+    def _rollout(self, state: State, depth: int, rng: random.Random) -> float:
         """Simulate random policy from state until terminal or max depth"""
+        # Hot loop: bind attribute lookups to locals once per rollout
+        is_terminal = self.mdp.is_terminal
+        actions_of = self._actions
+        step = self._step
+        rand = rng.random
+        gamma = self.cfg.gamma
         s = state
+        # Scalar discounted sum with per-step stdlib sampling: this module does not depend
+        # on NumPy, and a running accumulator is already the cheapest form in pure Python
         total_return = 0.0
         discount = 1.0
+        max_depth = self.cfg.max_depth
+        if self.heuristic is not None:
+            # Truncated rollout: the heuristic estimates the rest of the return
+            max_depth = min(max_depth, depth + self.cfg.rollout_depth)
         
-        while not self.mdp.is_terminal(s) and depth < self.cfg.max_depth:
-            actions = list(self.mdp.actions(s))
+        while not is_terminal(s) and depth < max_depth:
+            actions = actions_of(s)
             if not actions:
                 break
             
-            action = self.rng.choice(actions)
-            next_s, reward = sample_next_state_and_reward(self.mdp, s, action, self.rng)
+            # Uniform random action, indexed directly instead of via rng.choice
+            action = actions[int(rand() * len(actions))]
+            s, reward = step(s, action, rng)
             total_return += discount * reward
-            discount *= self.cfg.gamma
-            s = next_s
+            discount *= gamma
             depth += 1
         
+        if self.heuristic is not None and not is_terminal(s):
+            total_return += discount * self.heuristic(s)
         return total_return
 
+
+
+def _split(total: int, parts: int) -> List[int]:
+    """Split total into parts near-equal shares"""
+    share, extra = divmod(total, parts)
+    return [share + (1 if i < extra else 0) for i in range(parts)]
+
+
+def _root_stats(root: Node) -> Dict[Action, Tuple[int, float]]:
+    return {
+        a: (root.child_visits[i], root.child_value_sum[i])
+        for i, a in enumerate(root.actions)
+        if root.child_nodes[i] is not None
+    }
+
+
+# Per-process searcher for root parallelization, built once by the pool initializer.
+_worker: Optional[MCTS] = None
+
+
+def _init_worker(mdp: MDP, cfg: MCTSConfig, heuristic) -> None:
+    global _worker
+    _worker = MCTS(mdp, replace(cfg, workers=1), heuristic=heuristic)
+
+
+def _search_worker(task: Tuple[State, int, int]) -> Dict[Action, Tuple[int, float]]:
+    root_state, rollouts, seed = task
+    _worker.rng = random.Random(seed)
+    root = _worker._grow(root_state, rollouts)
+    stats = _root_stats(root)
+    _worker._release_graph()
+    return stats